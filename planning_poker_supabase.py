@@ -2,16 +2,41 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from dataclasses import dataclass, asdict
 import plotly.express as px
 import plotly.graph_objects as go
 import os
+import contextvars
+import logging
+from functools import partial, wraps
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+import httpx
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Cargar variables de entorno
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@st.cache_resource(show_spinner=False)
+def get_supabase_client(url, key) -> Client:
+    """Cliente Supabase único por proceso (reutiliza el pool HTTP entre reruns)"""
+    return create_client(url, key)
+
+@dataclass(slots=True)
+class EstimateRow:
+    """Fila de la tabla estimates"""
+    session_id: int
+    story_id: int
+    participant_id: int
+    estimate: str
+    estimated_at: str
+
 class PlanningPokerApp:
     def __init__(self):
         """Inicializa Planning Poker con conexión a Supabase"""
@@ -24,13 +49,14 @@ class PlanningPokerApp:
             st.stop()
         
         try:
-            self.supabase = create_client(self.supabase_url, self.supabase_key)
+            self.supabase = get_supabase_client(self.supabase_url, self.supabase_key)
         except Exception as e:
             st.error(f"❌ Error conectando a Supabase: {e}")
             st.stop()
         
         self.fibonacci_cards = [0, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89]
         self.special_cards = ['?', '∞']
+        self.all_cards = tuple(self.fibonacci_cards) + tuple(self.special_cards)
         
         # Inicializar session state
         if 'current_session_id' not in st.session_state:
@@ -51,6 +77,7 @@ class PlanningPokerApp:
             result = self.supabase.table('poker_sessions').insert(session_data).execute()
             
             if result.data:
+                get_sessions_df.clear()
                 st.session_state.current_session_id = result.data[0]['id']
                 st.session_state.session_name = name
                 return True
@@ -59,30 +86,6 @@ class PlanningPokerApp:
             st.error(f"Error creando sesión: {e}")
             return False
 
-    def get_sessions_df(self):
-        """Obtiene DataFrame de sesiones"""
-        try:
-            result = self.supabase.table('poker_sessions').select('*').order('created_at', desc=True).execute()
-            return pd.DataFrame(result.data) if result.data else pd.DataFrame()
-        except:
-            return pd.DataFrame()
-
-    def get_participants_df(self, session_id):
-        """Obtiene DataFrame de participantes"""
-        try:
-            result = self.supabase.table('participants').select('*').eq('session_id', session_id).execute()
-            return pd.DataFrame(result.data) if result.data else pd.DataFrame()
-        except:
-            return pd.DataFrame()
-
-    def get_stories_df(self, session_id):
-        """Obtiene DataFrame de historias"""
-        try:
-            result = self.supabase.table('user_stories').select('*').eq('session_id', session_id).execute()
-            return pd.DataFrame(result.data) if result.data else pd.DataFrame()
-        except:
-            return pd.DataFrame()
-
     def add_participant(self, name, role, email):
         """Añade participante"""
         try:
@@ -95,6 +98,8 @@ class PlanningPokerApp:
             }
             
             result = self.supabase.table('participants').insert(participant_data).execute()
+            get_participants_df.clear()
+            get_export_df.clear()
             return bool(result.data)
         except Exception as e:
             st.error(f"Error añadiendo participante: {e}")
@@ -115,90 +120,242 @@ class PlanningPokerApp:
             }
             
             result = self.supabase.table('user_stories').insert(story_data).execute()
+            get_stories_df.clear()
+            get_export_df.clear()
             return bool(result.data)
         except Exception as e:
             st.error(f"Error añadiendo historia: {e}")
             return False
 
-    def save_estimates(self, story_db_id, estimates_dict):
-        """Guarda estimaciones"""
+    def _build_estimates_data(self, story_db_id, estimates_dict):
+        """Construye las filas de estimaciones a partir de {participant_id: estimación}"""
+        # Una ronda de estimación es un único evento: mismo timestamp para todas las filas
+        now = datetime.now().isoformat()
+        session_id = st.session_state.current_session_id
+        return [
+            EstimateRow(session_id, int(story_db_id), participant_id, str(estimate), now)
+            for participant_id, estimate in estimates_dict.items()
+        ]
+
+    def commit_consensus(self, story_db_id, estimates_dict, final_estimate):
+        """Guarda estimaciones y marca la historia como estimada en una sola transacción"""
         try:
-            participants_df = self.get_participants_df(st.session_state.current_session_id)
-            
-            estimates_data = []
-            for participant_name, estimate in estimates_dict.items():
-                participant_row = participants_df[participants_df['name'] == participant_name]
-                if not participant_row.empty:
-                    participant_id = participant_row.iloc[0]['id']
-                    
-                    estimates_data.append({
-                        'session_id': st.session_state.current_session_id,
-                        'story_id': story_db_id,
-                        'participant_id': participant_id,
-                        'estimate': str(estimate),
-                        'estimated_at': datetime.now().isoformat()
-                    })
+            estimates_data = self._build_estimates_data(story_db_id, estimates_dict)
+            if not estimates_data:
+                return False
             
-            if estimates_data:
-                result = self.supabase.table('estimates').insert(estimates_data).execute()
-                return bool(result.data)
-            return False
+            # RPC definida en supabase/migrations: INSERT + UPDATE en un solo viaje
+            self.supabase.rpc('commit_estimates', {
+                'p_session_id': st.session_state.current_session_id,
+                'p_story_id': int(story_db_id),
+                'p_estimates': [asdict(row) for row in estimates_data],
+                'p_final_estimate': final_estimate
+            }).execute()
+            get_estimates_df.clear()
+            get_session_stats.clear()
+            get_participant_stats_df.clear()
+            get_stories_df.clear()
+            get_export_df.clear()
+            return True
         except Exception as e:
-            st.error(f"Error guardando estimaciones: {e}")
+            st.error(f"Error guardando consenso: {e}")
             return False
 
-    def get_estimates_df(self, session_id):
-        """Obtiene DataFrame de estimaciones con información enriquecida"""
-        try:
-            estimates_result = self.supabase.table('estimates').select('*').eq('session_id', session_id).execute()
-            if not estimates_result.data:
-                return pd.DataFrame()
-            
-            estimates_data = []
-            for estimate in estimates_result.data:
-                # Obtener participante
-                participant_result = self.supabase.table('participants').select('name, role').eq('id', estimate['participant_id']).execute()
-                participant_name = participant_result.data[0]['name'] if participant_result.data else 'Desconocido'
-                participant_role = participant_result.data[0]['role'] if participant_result.data else 'N/A'
-                
-                # Obtener historia
-                story_result = self.supabase.table('user_stories').select('story_id, title').eq('id', estimate['story_id']).execute()
-                story_id = story_result.data[0]['story_id'] if story_result.data else 'N/A'
-                story_title = story_result.data[0]['title'] if story_result.data else 'N/A'
-                
-                estimates_data.append({
-                    'story_id': story_id,
-                    'story_title': story_title,
-                    'participant_name': participant_name,
-                    'participant_role': participant_role,
-                    'estimate': estimate['estimate'],
-                    'estimated_at': estimate['estimated_at']
-                })
-            
-            return pd.DataFrame(estimates_data)
-        except Exception as e:
-            st.error(f"Error obteniendo estimaciones: {e}")
-            return pd.DataFrame()
+# Reintento con backoff solo ante fallos de red transitorios (los errores de PostgREST no se reintentan)
+@retry(
+    retry=retry_if_exception_type(httpx.HTTPError),
+    wait=wait_exponential(multiplier=0.5, max=4),
+    stop=stop_after_attempt(3),
+    reraise=True
+)
+def execute_with_retry(query):
+    """Ejecuta una consulta de Supabase reintentando errores de red"""
+    return query.execute()
+
+def cached_read(label, default=pd.DataFrame, show_error=True):
+    """Cachea una lectura de Supabase sin memorizar sus fallos: el error se captura fuera de la caché"""
+    def decorator(func):
+        cached = st.cache_data(ttl=30, show_spinner=False)(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return cached(*args, **kwargs)
+            except (httpx.HTTPError, APIError) as e:
+                logger.warning("Error obteniendo %s: %s", label, e)
+                if show_error:
+                    st.error(f"Error obteniendo {label}: {e}")
+                return default()
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+# Lecturas cacheadas: `_poker` no se hashea, la clave es session_id
+@cached_read('sesiones', show_error=False)
+def get_sessions_df(_poker):
+    """Obtiene DataFrame de sesiones"""
+    result = execute_with_retry(_poker.supabase.table('poker_sessions').select('id, name, facilitator').order('created_at', desc=True))
+    return pd.DataFrame(result.data) if result.data else pd.DataFrame()
+
+@cached_read('participantes', show_error=False)
+def get_participants_df(_poker, session_id):
+    """Obtiene DataFrame de participantes"""
+    result = execute_with_retry(_poker.supabase.table('participants').select('id, name, role, email, joined_at').eq('session_id', session_id))
+    return pd.DataFrame(result.data) if result.data else pd.DataFrame()
+
+@cached_read('historias', show_error=False)
+def get_stories_df(_poker, session_id):
+    """Obtiene DataFrame de historias"""
+    result = execute_with_retry(_poker.supabase.table('user_stories').select(
+        'id, story_id, title, priority, status, final_estimate'
+    ).eq('session_id', session_id))
+    return pd.DataFrame(result.data) if result.data else pd.DataFrame()
+
+@cached_read('estimaciones')
+def get_estimates_df(_poker, session_id):
+    """Obtiene DataFrame de estimaciones con información enriquecida"""
+    # Una sola consulta: PostgREST embebe participante e historia vía FK
+    estimates_result = execute_with_retry(_poker.supabase.table('estimates').select(
+        'estimate, estimated_at, '
+        'participant:participants(name, role), '
+        'story:user_stories(story_id, title)'
+    ).eq('session_id', session_id))
+    if not estimates_result.data:
+        return pd.DataFrame()
+
+    estimates_df = pd.json_normalize(estimates_result.data, sep='_')
+    estimates_df = estimates_df.rename(columns={'story_story_id': 'story_id'}).reindex(columns=[
+        'story_id', 'story_title', 'participant_name', 'participant_role', 'estimate', 'estimated_at'
+    ])
+    return estimates_df.fillna({
+        'story_id': 'N/A',
+        'story_title': 'N/A',
+        'participant_name': 'Desconocido',
+        'participant_role': 'N/A'
+    })
+
+@cached_read('historia', default=dict)
+def get_story_details(_poker, story_db_id):
+    """Obtiene descripción y criterios de una historia (texto largo, bajo demanda)"""
+    result = execute_with_retry(_poker.supabase.table('user_stories').select(
+        'description, acceptance_criteria'
+    ).eq('id', story_db_id))
+    return result.data[0] if result.data else {}
+
+@cached_read('datos de exportación')
+def get_export_df(_poker, session_id, table):
+    """Obtiene todas las columnas de una tabla de la sesión (solo para exportar)"""
+    result = execute_with_retry(_poker.supabase.table(table).select('*').eq('session_id', session_id))
+    return pd.DataFrame(result.data) if result.data else pd.DataFrame()
+
+@cached_read('métricas', default=dict)
+def get_session_stats(_poker, session_id):
+    """Obtiene las métricas agregadas de la sesión (vista session_stats)"""
+    result = execute_with_retry(_poker.supabase.table('session_stats').select(
+        'stories, total, participants, avg_est, median'
+    ).eq('session_id', session_id))
+    return result.data[0] if result.data else {}
+
+@cached_read('métricas por participante')
+def get_participant_stats_df(_poker, session_id):
+    """Obtiene el promedio por participante (vista per_participant_stats)"""
+    result = execute_with_retry(_poker.supabase.table('per_participant_stats').select(
+        'participant_name, avg_est'
+    ).eq('session_id', session_id))
+    return pd.DataFrame(result.data) if result.data else pd.DataFrame()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_numeric_estimates(estimates_df):
+    """Convierte las estimaciones a numérico una sola vez (descarta '?' y '∞')"""
+    return pd.to_numeric(estimates_df['estimate'], errors='coerce').dropna()
+
+def fetch_concurrently(poker, session_id, *getters):
+    """Ejecuta varias lecturas de Supabase en paralelo y devuelve sus DataFrames en orden"""
+    ctx = get_script_run_ctx()
+    # Una copia de los ContextVars por lectura: conserva el contenedor actual (p. ej. la pestaña)
+    # para que un st.error emitido en el hilo se pinte donde se hizo la llamada
+    contexts = [contextvars.copy_context() for _ in getters]
+
+    def run(getter, context):
+        # Los hilos del pool necesitan el contexto de Streamlit para st.cache_data/st.error
+        add_script_run_ctx(ctx=ctx)
+        return context.run(getter, poker, session_id)
+
+    with ThreadPoolExecutor(max_workers=len(getters)) as executor:
+        return list(executor.map(run, getters, contexts))
+
+# Figuras Plotly cacheadas: solo se reconstruyen si cambian los datos de entrada
+@st.cache_data(ttl=60, show_spinner=False)
+def build_roles_chart(role_counts):
+    """Gráfico circular de participantes por rol"""
+    return px.pie(
+        role_counts,
+        values='count',
+        names='role',
+        title="Distribución por Roles"
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_priority_chart(priority_counts):
+    """Gráfico de barras de historias por prioridad"""
+    return px.bar(
+        priority_counts,
+        x='priority',
+        y='count',
+        title="Historias por Prioridad",
+        color='priority'
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_estimates_chart(participants, values):
+    """Gráfico de barras de la ronda de estimación actual"""
+    return px.bar(
+        x=list(participants),
+        y=list(values),
+        title="Estimaciones por Participante",
+        labels={'x': 'Participante', 'y': 'Estimación'}
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_distribution_chart(numeric_estimates):
+    """Histograma de estimaciones numéricas"""
+    return px.histogram(
+        numeric_estimates,
+        nbins=20,
+        title="Distribución de Estimaciones"
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_participant_chart(participant_stats):
+    """Gráfico de barras del promedio por participante"""
+    return px.bar(
+        participant_stats,
+        x='Participante',
+        y='Promedio_Estimacion',
+        title="Promedio por Participante"
+    )
 
 def render_sidebar(poker):
     """Renderiza el sidebar con gestión de sesiones"""
     st.sidebar.header("🎯 Gestión de Sesiones")
     
-    sessions_df = poker.get_sessions_df()
+    sessions_df = get_sessions_df(poker)
     
     # Cargar sesión existente
     if not sessions_df.empty:
         st.sidebar.subheader("📋 Sesiones Existentes")
+        session_lookup = sessions_df.set_index('id')[['name', 'facilitator']]
         selected_session = st.sidebar.selectbox(
             "Selecciona una sesión:",
             options=sessions_df['id'].tolist(),
-            format_func=lambda x: f"{sessions_df[sessions_df['id']==x]['name'].iloc[0]} - {sessions_df[sessions_df['id']==x]['facilitator'].iloc[0]}",
+            format_func=lambda x: f"{session_lookup.loc[x, 'name']} - {session_lookup.loc[x, 'facilitator']}",
             key="session_selector"
         )
         
         if st.sidebar.button("🔄 Cargar Sesión"):
             st.session_state.current_session_id = selected_session
-            st.session_state.session_name = sessions_df[sessions_df['id']==selected_session]['name'].iloc[0]
+            st.session_state.session_name = session_lookup.loc[selected_session, 'name']
             st.success(f"✅ Sesión cargada: {st.session_state.session_name}")
             st.rerun()
     
@@ -218,7 +375,7 @@ def render_sidebar(poker):
             else:
                 st.error("❌ Completa todos los campos")
 
-def render_participants_tab(poker):
+def render_participants_tab(poker, participants_df):
     """Renderiza la pestaña de participantes"""
     st.subheader("👥 Gestión de Participantes")
     
@@ -243,8 +400,6 @@ def render_participants_tab(poker):
     
     with col2:
         st.markdown("### 👥 Participantes Actuales")
-        participants_df = poker.get_participants_df(st.session_state.current_session_id)
-        
         if not participants_df.empty:
             # Métricas
             col1_metrics, col2_metrics, col3_metrics = st.columns(3)
@@ -267,17 +422,12 @@ def render_participants_tab(poker):
             if len(participants_df) > 1:
                 role_counts = participants_df['role'].value_counts().reset_index()
                 role_counts.columns = ['role', 'count']
-                fig_roles = px.pie(
-                    role_counts,
-                    values='count',
-                    names='role',
-                    title="Distribución por Roles"
-                )
+                fig_roles = build_roles_chart(role_counts)
                 st.plotly_chart(fig_roles, use_container_width=True)
         else:
             st.info("👤 No hay participantes. Añade algunos para comenzar.")
 
-def render_stories_tab(poker):
+def render_stories_tab(poker, stories_df):
     """Renderiza la pestaña de historias de usuario"""
     st.subheader("📝 Gestión de Historias de Usuario")
     
@@ -304,8 +454,6 @@ def render_stories_tab(poker):
     
     with col2:
         st.markdown("### 📋 Historias Actuales")
-        stories_df = poker.get_stories_df(st.session_state.current_session_id)
-        
         if not stories_df.empty:
             # Métricas de historias
             estimated_stories = stories_df[stories_df['status'] == 'estimated']
@@ -331,24 +479,15 @@ def render_stories_tab(poker):
             # Gráfico de prioridades
             priority_counts = stories_df['priority'].value_counts().reset_index()
             priority_counts.columns = ['priority', 'count']
-            fig_priority = px.bar(
-                priority_counts,
-                x='priority',
-                y='count',
-                title="Historias por Prioridad",
-                color='priority'
-            )
+            fig_priority = build_priority_chart(priority_counts)
             st.plotly_chart(fig_priority, use_container_width=True)
         else:
             st.info("📝 No hay historias. Añade algunas para comenzar.")
 
-def render_estimation_tab(poker):
+def render_estimation_tab(poker, stories_df, participants_df):
     """Renderiza la pestaña de estimación"""
     st.subheader("🎯 Proceso de Estimación")
     
-    stories_df = poker.get_stories_df(st.session_state.current_session_id)
-    participants_df = poker.get_participants_df(st.session_state.current_session_id)
-    
     if stories_df.empty:
         st.warning("📝 Primero añade algunas historias de usuario")
         return
@@ -362,22 +501,24 @@ def render_estimation_tab(poker):
     if not pending_stories.empty:
         st.markdown("### 🎲 Selecciona Historia para Estimar")
         
+        story_titles = pending_stories.drop_duplicates('story_id').set_index('story_id')['title']
         selected_story = st.selectbox(
             "Historia:",
             options=pending_stories['story_id'].tolist(),
-            format_func=lambda x: f"{x} - {pending_stories[pending_stories['story_id']==x]['title'].iloc[0]}"
+            format_func=lambda x: f"{x} - {story_titles.loc[x]}"
         )
         
         if selected_story:
             story_row = stories_df[stories_df['story_id'] == selected_story].iloc[0]
+            story_details = get_story_details(poker, int(story_row['id']))
             
             # Mostrar detalles de la historia
             st.markdown(f"""
             **📋 {story_row['title']}**
             
-            **Descripción:** {story_row['description']}
+            **Descripción:** {story_details.get('description')}
             
-            **Criterios:** {story_row['acceptance_criteria']}
+            **Criterios:** {story_details.get('acceptance_criteria')}
             
             **Prioridad:** {story_row['priority']}
             """)
@@ -385,56 +526,61 @@ def render_estimation_tab(poker):
             st.markdown("---")
             st.markdown("### 🃏 Cartas de Estimación")
             
-            # Mostrar cartas disponibles
-            all_cards = poker.fibonacci_cards + poker.special_cards
-            cols = st.columns(len(all_cards))
-            for i, card in enumerate(all_cards):
-                with cols[i]:
-                    st.markdown(f"""
-                    <div style="border: 2px solid #e0e0e0; border-radius: 10px; padding: 1rem; margin: 0.5rem; text-align: center; background: #f8f9fa;">
-                        <h3>{card}</h3>
-                    </div>
-                    """, unsafe_allow_html=True)
+            # Mostrar cartas disponibles en un único bloque HTML (un solo elemento)
+            cards_html = "".join(
+                f'<div style="border: 2px solid #e0e0e0; border-radius: 10px; padding: 1rem; text-align: center; background: #f8f9fa;"><h3>{card}</h3></div>'
+                for card in poker.all_cards
+            )
+            st.markdown(
+                f'<div style="display: grid; grid-template-columns: repeat({len(poker.all_cards)}, 1fr); gap: 0.5rem; margin: 0.5rem 0;">{cards_html}</div>',
+                unsafe_allow_html=True
+            )
             
             st.markdown("### 👥 Estimaciones de Participantes")
             
             estimates = {}
-            for _, participant in participants_df.iterrows():
+            participant_names = {}
+            for participant in participants_df[['id', 'name', 'role']].itertuples(index=False):
                 col1, col2 = st.columns([1, 3])
                 with col1:
-                    st.write(f"**{participant['name']}** ({participant['role']})")
+                    st.write(f"**{participant.name}** ({participant.role})")
                 with col2:
                     estimate = st.selectbox(
                         f"Estimación",
-                        options=all_cards,
-                        key=f"estimate_{participant['id']}",
+                        options=poker.all_cards,
+                        key=f"estimate_{participant.id}",
                         label_visibility="collapsed"
                     )
-                    estimates[participant['name']] = estimate
+                    estimates[participant.id] = estimate
+                    participant_names[participant.id] = participant.name
             
             if st.button("🎯 Procesar Estimaciones", type="primary"):
-                analyze_estimates(poker, story_row, estimates)
+                analyze_estimates(poker, story_row, estimates, participant_names)
     else:
         st.info("✅ Todas las historias han sido estimadas")
 
-def analyze_estimates(poker, story_row, estimates):
-    """Analiza las estimaciones y guarda resultados"""
+def analyze_estimates(poker, story_row, estimates, participant_names):
+    """Analiza las estimaciones ({participant_id: estimación}) y guarda resultados"""
     numeric_estimates = []
     special_estimates = []
     
-    for participant, estimate in estimates.items():
+    for participant_id, estimate in estimates.items():
+        participant = participant_names[participant_id]
         if estimate in ['?', '∞']:
             special_estimates.append((participant, estimate))
         else:
             try:
                 numeric_estimates.append((participant, float(estimate)))
-            except:
+            except ValueError:
                 pass
     
     st.markdown("### 📊 Resultados de Estimación")
     
     # Mostrar todas las estimaciones
-    results_df = pd.DataFrame(list(estimates.items()), columns=['Participante', 'Estimación'])
+    results_df = pd.DataFrame(
+        [(participant_names[participant_id], estimate) for participant_id, estimate in estimates.items()],
+        columns=['Participante', 'Estimación']
+    )
     st.dataframe(results_df, use_container_width=True, hide_index=True)
     
     if special_estimates:
@@ -455,11 +601,9 @@ def analyze_estimates(poker, story_row, estimates):
             st.metric("Promedio", f"{np.mean(values):.1f}")
         
         # Gráfico de estimaciones
-        fig = px.bar(
-            x=[est[0] for est in numeric_estimates],
-            y=[est[1] for est in numeric_estimates],
-            title="Estimaciones por Participante",
-            labels={'x': 'Participante', 'y': 'Estimación'}
+        fig = build_estimates_chart(
+            tuple(est[0] for est in numeric_estimates),
+            tuple(est[1] for est in numeric_estimates)
         )
         st.plotly_chart(fig, use_container_width=True)
         
@@ -468,76 +612,57 @@ def analyze_estimates(poker, story_row, estimates):
         if len(unique_values) == 1:
             st.success(f"🎉 ¡CONSENSO! Todos estimaron: {values[0]}")
             
-            # Guardar estimaciones
-            if poker.save_estimates(story_row['id'], estimates):
-                try:
-                    poker.supabase.table('user_stories').update({
-                        'status': 'estimated',
-                        'final_estimate': values[0],
-                        'last_estimated_at': datetime.now().isoformat()
-                    }).eq('id', story_row['id']).execute()
-                    
-                    st.success("✅ Estimación guardada!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error actualizando historia: {e}")
+            # Guardar estimaciones y cerrar la historia
+            if poker.commit_consensus(story_row['id'], estimates, values[0]):
+                st.success("✅ Estimación guardada!")
+                st.rerun()
         else:
             st.warning(f"🔄 Sin consenso. Rango: {min(values)} - {max(values)}")
             st.info("💬 Discutan las diferencias y vuelvan a estimar")
 
-def render_analytics_tab(poker):
+def render_analytics_tab(poker, estimates_df):
     """Renderiza la pestaña de analytics"""
     st.subheader("📊 Analytics de la Sesión")
     
-    estimates_df = poker.get_estimates_df(st.session_state.current_session_id)
+    # Las agregaciones se calculan en Postgres; las filas solo alimentan histograma y detalle
+    session_stats, participant_stats = fetch_concurrently(
+        poker, st.session_state.current_session_id,
+        get_session_stats, get_participant_stats_df
+    )
     
     if not estimates_df.empty:
         # Métricas generales
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            unique_stories = estimates_df['story_id'].nunique()
-            st.metric("Historias Estimadas", unique_stories)
+            st.metric("Historias Estimadas", session_stats.get('stories', 0))
         
         with col2:
-            total_estimates = len(estimates_df)
-            st.metric("Total Estimaciones", total_estimates)
+            st.metric("Total Estimaciones", session_stats.get('total', 0))
         
         with col3:
-            numeric_estimates = pd.to_numeric(estimates_df['estimate'], errors='coerce').dropna()
-            avg_estimate = numeric_estimates.mean() if not numeric_estimates.empty else 0
+            avg_estimate = session_stats.get('avg_est') or 0
             st.metric("Promedio", f"{avg_estimate:.1f}")
         
         with col4:
-            participants_estimating = estimates_df['participant_name'].nunique()
-            st.metric("Participantes Activos", participants_estimating)
+            st.metric("Participantes Activos", session_stats.get('participants', 0))
         
         # Gráficos de análisis
         col1, col2 = st.columns(2)
         
         with col1:
+            numeric_estimates = get_numeric_estimates(estimates_df)
             if not numeric_estimates.empty:
-                fig_dist = px.histogram(
-                    numeric_estimates,
-                    nbins=20,
-                    title="Distribución de Estimaciones"
-                )
+                fig_dist = build_distribution_chart(numeric_estimates)
                 st.plotly_chart(fig_dist, use_container_width=True)
         
         with col2:
-            participant_stats = estimates_df.groupby('participant_name')['estimate'].apply(
-                lambda x: pd.to_numeric(x, errors='coerce').mean()
-            ).reset_index()
-            participant_stats.columns = ['Participante', 'Promedio_Estimacion']
-            participant_stats = participant_stats.dropna()
-            
             if not participant_stats.empty:
-                fig_participant = px.bar(
-                    participant_stats,
-                    x='Participante',
-                    y='Promedio_Estimacion',
-                    title="Promedio por Participante"
-                )
+                participant_stats = participant_stats.rename(columns={
+                    'participant_name': 'Participante',
+                    'avg_est': 'Promedio_Estimacion'
+                })
+                fig_participant = build_participant_chart(participant_stats)
                 st.plotly_chart(fig_participant, use_container_width=True)
         
         # Tabla detallada
@@ -550,14 +675,50 @@ def render_analytics_tab(poker):
     else:
         st.info("🎯 No hay estimaciones aún.")
 
-def render_reports_tab(poker):
+@st.cache_data(ttl=60, show_spinner=False)
+def build_csv_bytes(df):
+    """Serializa un DataFrame a CSV (bytes UTF-8); se cachea por su contenido"""
+    buffer = BytesIO()
+    df.to_csv(buffer, index=False, encoding='utf-8', lineterminator='\n')
+    return buffer.getvalue()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_excel_report(participants_df, stories_df, estimates_df):
+    """Genera el reporte Excel completo; se cachea por el contenido de los DataFrames"""
+    buffer = BytesIO()
+    # Sin constant_memory: to_excel escribe por columnas y ese modo descarta celdas de filas ya volcadas
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        if not participants_df.empty:
+            participants_df.to_excel(writer, sheet_name='Participantes', index=False)
+        if not stories_df.empty:
+            stories_df.to_excel(writer, sheet_name='Historias', index=False)
+        if not estimates_df.empty:
+            estimates_df.to_excel(writer, sheet_name='Estimaciones', index=False)
+        
+        # Hoja de resumen
+        estimated_stories = stories_df[stories_df['status'] == 'estimated'] if not stories_df.empty else pd.DataFrame()
+        total_points = estimated_stories['final_estimate'].sum() if 'final_estimate' in estimated_stories.columns and not estimated_stories.empty else 0
+        
+        summary_data = {
+            'Métrica': ['Total Participantes', 'Total Historias', 'Historias Estimadas', 'Total Estimaciones', 'Story Points'],
+            'Valor': [
+                len(participants_df) if not participants_df.empty else 0,
+                len(stories_df) if not stories_df.empty else 0,
+                len(estimated_stories) if not estimated_stories.empty else 0,
+                len(estimates_df) if not estimates_df.empty else 0,
+                total_points
+            ]
+        }
+        summary_df = pd.DataFrame(summary_data)
+        summary_df.to_excel(writer, sheet_name='Resumen', index=False)
+    
+    return buffer.getvalue()
+
+def render_reports_tab(poker, stories_df, participants_df, estimates_df):
     """Renderiza la pestaña de reportes"""
     st.subheader("📈 Reportes y Exportación")
     
-    # Obtener datos
-    stories_df = poker.get_stories_df(st.session_state.current_session_id)
-    participants_df = poker.get_participants_df(st.session_state.current_session_id)
-    estimates_df = poker.get_estimates_df(st.session_state.current_session_id)
+    session_stats = get_session_stats(poker, st.session_state.current_session_id)
     
     st.markdown("### 📊 Resumen Ejecutivo")
     
@@ -578,24 +739,29 @@ def render_reports_tab(poker):
     
     with col2:
         if not estimates_df.empty:
-            numeric_estimates = pd.to_numeric(estimates_df['estimate'], errors='coerce').dropna()
-            
             st.markdown(f"""
             **🎯 Estimaciones:**
             - Total: {len(estimates_df)}
-            - Promedio: {numeric_estimates.mean():.1f}
-            - Mediana: {numeric_estimates.median():.1f}
+            - Promedio: {session_stats.get('avg_est') or 0:.1f}
+            - Mediana: {session_stats.get('median') or 0:.1f}
             - Participantes: {participants_df['name'].nunique() if not participants_df.empty else 0}
             """)
     
     # Exportación
     st.markdown("### 📁 Exportar Datos")
     
+    # Columnas completas (descripción, criterios...): solo se leen con esta pestaña abierta
+    stories_df, participants_df = fetch_concurrently(
+        poker, st.session_state.current_session_id,
+        partial(get_export_df, table='user_stories'),
+        partial(get_export_df, table='participants')
+    )
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
         if not participants_df.empty:
-            csv = participants_df.to_csv(index=False)
+            csv = build_csv_bytes(participants_df)
             st.download_button(
                 label="📥 Participantes CSV",
                 data=csv,
@@ -605,7 +771,7 @@ def render_reports_tab(poker):
     
     with col2:
         if not stories_df.empty:
-            csv = stories_df.to_csv(index=False)
+            csv = build_csv_bytes(stories_df)
             st.download_button(
                 label="📥 Historias CSV",
                 data=csv,
@@ -615,7 +781,7 @@ def render_reports_tab(poker):
     
     with col3:
         if not estimates_df.empty:
-            csv = estimates_df.to_csv(index=False)
+            csv = build_csv_bytes(estimates_df)
             st.download_button(
                 label="📥 Estimaciones CSV",
                 data=csv,
@@ -629,36 +795,10 @@ def render_reports_tab(poker):
         
         if st.button("📋 Generar Reporte Excel"):
             try:
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    if not participants_df.empty:
-                        participants_df.to_excel(writer, sheet_name='Participantes', index=False)
-                    if not stories_df.empty:
-                        stories_df.to_excel(writer, sheet_name='Historias', index=False)
-                    if not estimates_df.empty:
-                        estimates_df.to_excel(writer, sheet_name='Estimaciones', index=False)
-                    
-                    # Hoja de resumen
-                    estimated_stories = stories_df[stories_df['status'] == 'estimated'] if not stories_df.empty else pd.DataFrame()
-                    total_points = estimated_stories['final_estimate'].sum() if 'final_estimate' in estimated_stories.columns and not estimated_stories.empty else 0
-                    
-                    summary_data = {
-                        'Métrica': ['Total Participantes', 'Total Historias', 'Historias Estimadas', 'Total Estimaciones', 'Story Points'],
-                        'Valor': [
-                            len(participants_df) if not participants_df.empty else 0,
-                            len(stories_df) if not stories_df.empty else 0,
-                            len(estimated_stories) if not estimated_stories.empty else 0,
-                            len(estimates_df) if not estimates_df.empty else 0,
-                            total_points
-                        ]
-                    }
-                    summary_df = pd.DataFrame(summary_data)
-                    summary_df.to_excel(writer, sheet_name='Resumen', index=False)
-                
-                buffer.seek(0)
+                excel_bytes = build_excel_report(participants_df, stories_df, estimates_df)
                 st.download_button(
                     label="📊 Descargar Reporte Excel",
-                    data=buffer.read(),
+                    data=excel_bytes,
                     file_name=f"reporte_planning_poker_{st.session_state.session_name}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                 )
@@ -701,7 +841,13 @@ def main():
     if st.session_state.current_session_id:
         st.header(f"📊 Sesión Activa: {st.session_state.session_name}")
         
-        # Tabs principales
+        # Lecturas compartidas por varias pestañas: una sola vez por rerun
+        stories_df, participants_df, estimates_df = fetch_concurrently(
+            poker, st.session_state.current_session_id,
+            get_stories_df, get_participants_df, get_estimates_df
+        )
+        
+        # Tabs principales: solo se renderiza la pestaña abierta (on_change="rerun" expone .open)
         tab1, tab2, tab3, tab4, tab5 = st.tabs([
             "👥 Participantes", 
             "📝 Historias", 
@@ -709,22 +855,27 @@ def main():
             "📊 Analytics", 
             
                     "📈 Reportes"
-        ])
+        ], key="main_tabs", on_change="rerun")
 
         with tab1:
-            render_participants_tab(poker)
+            if tab1.open:
+                render_participants_tab(poker, participants_df)
 
         with tab2:
-            render_stories_tab(poker)
+            if tab2.open:
+                render_stories_tab(poker, stories_df)
 
         with tab3:
-            render_estimation_tab(poker)
+            if tab3.open:
+                render_estimation_tab(poker, stories_df, participants_df)
 
         with tab4:
-            render_analytics_tab(poker)
+            if tab4.open:
+                render_analytics_tab(poker, estimates_df)
 
         with tab5:
-            render_reports_tab(poker)
+            if tab5.open:
+                render_reports_tab(poker, stories_df, participants_df, estimates_df)
 
         # Controles de sesión en la parte superior del contenido
         st.markdown("---")
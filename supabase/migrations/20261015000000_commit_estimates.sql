@@ -0,0 +1,28 @@
+-- Guarda las estimaciones de una historia y la marca como estimada
+-- en una sola transacción (un único round-trip desde la app).
+create or replace function public.commit_estimates(
+    p_session_id bigint,
+    p_story_id bigint,
+    p_estimates jsonb,
+    p_final_estimate numeric
+)
+returns integer
+language plpgsql
+as $$
+declare
+    inserted integer;
+begin
+    insert into public.estimates (session_id, story_id, participant_id, estimate, estimated_at)
+    select p_session_id, p_story_id, e.participant_id, e.estimate, e.estimated_at
+    from jsonb_populate_recordset(null::public.estimates, p_estimates) as e;
+    get diagnostics inserted = row_count;
+
+    update public.user_stories
+    set status = 'estimated',
+        final_estimate = p_final_estimate,
+        last_estimated_at = now()
+    where id = p_story_id;
+
+    return inserted;
+end;
+$$;
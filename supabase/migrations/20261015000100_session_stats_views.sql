@@ -0,0 +1,37 @@
+-- Agregaciones del dashboard de analytics calculadas en Postgres.
+-- Las cartas especiales ('?', '∞') se descartan al convertir a numeric.
+-- security_invoker: las vistas respetan el RLS de estimates/participants
+-- para el rol que consulta (anon) en lugar de usar los permisos del dueño.
+create or replace view public.session_stats
+with (security_invoker = on) as
+with numeric_estimates as (
+    select
+        e.session_id,
+        e.story_id,
+        p.name as participant_name,
+        case when e.estimate ~ '^[0-9]+(\.[0-9]+)?$' then e.estimate::numeric end as value
+    from public.estimates e
+    left join public.participants p on p.id = e.participant_id
+)
+select
+    session_id,
+    count(distinct story_id) as stories,
+    count(*) as total,
+    -- Participantes por nombre, igual que per_participant_stats
+    count(distinct participant_name) as participants,
+    avg(value) as avg_est,
+    percentile_cont(0.5) within group (order by value) as median
+from numeric_estimates
+group by session_id;
+
+-- Agrupado por nombre, como el cálculo original en pandas
+create or replace view public.per_participant_stats
+with (security_invoker = on) as
+select
+    e.session_id,
+    p.name as participant_name,
+    avg(case when e.estimate ~ '^[0-9]+(\.[0-9]+)?$' then e.estimate::numeric end) as avg_est
+from public.estimates e
+join public.participants p on p.id = e.participant_id
+group by e.session_id, p.name
+having avg(case when e.estimate ~ '^[0-9]+(\.[0-9]+)?$' then e.estimate::numeric end) is not null;
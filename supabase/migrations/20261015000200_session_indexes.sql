@@ -0,0 +1,16 @@
+-- Índices para las lecturas filtradas por session_id y para los joins
+-- embebidos de get_estimates_df (estimates -> participants / user_stories).
+--
+-- Sin CONCURRENTLY: las migraciones se aplican dentro de una transacción.
+-- Para tablas grandes en producción, ejecutar manualmente con
+-- CREATE INDEX CONCURRENTLY fuera de una transacción.
+create index if not exists idx_participants_session on public.participants (session_id);
+create index if not exists idx_user_stories_session on public.user_stories (session_id);
+create index if not exists idx_estimates_session on public.estimates (session_id);
+create index if not exists idx_estimates_story on public.estimates (story_id);
+create index if not exists idx_estimates_participant on public.estimates (participant_id);
+
+-- Verificación (debe mostrar "Index Scan" / "Bitmap Index Scan"):
+--   explain analyze select * from public.participants where session_id = 1;
+--   explain analyze select * from public.user_stories where session_id = 1;
+--   explain analyze select * from public.estimates where session_id = 1;